@@ -1,123 +1,386 @@
 #!/usr/bin/python3
 
+import os
 import re
 import sys
 import socket
-import selectors
 import logging
 import subprocess
 import select
+from functools import lru_cache, partial
 from time import monotonic as _time
 
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+try:
+    from ._hotloop import read_until as _read_until
+except ImportError:
+    _read_until = None
+
 __all__ = ["SocketBackend", "ProcessBackend", "Interact"]
 
+_log = logging.getLogger("pyinteract")
+
+# reads only ever wait on the backend's fd (plus the console in interact), so
+# they poll directly rather than paying for the selectors bookkeeping; epoll
+# takes seconds, poll ms
+if hasattr(select, "epoll"):
+    _Poller, _POLLIN, _POLL_SCALE = select.epoll, select.EPOLLIN, 1
+else:
+    _Poller, _POLLIN, _POLL_SCALE = select.poll, select.POLLIN, 1000
+
+# numbered backreferences and group conditionals would point at the wrong
+# group once a pattern is wrapped and renumbered inside the combined regex
+_GROUP_REFS = re.compile(r"\\[1-9]|\(\?\(")
+
+def _compile(option):
+    if isinstance(option, str):
+        option = option.encode()
+    if isinstance(option, bytes):
+        return re.compile(option, re.DOTALL)
+    return option
+
+# re syntax that RE2 reads more narrowly, so a set could miss what re finds:
+# \s (RE2 leaves out \v), \B (scans start mid-buffer), {,n} and [[:x:]]
+_RE2_NARROWER = re.compile(rb"\\[sB]|\{,|\[:")
+
+def _prefilter(options):
+    """Compile an RE2 set matching a superset of what options match, or None.
+
+    Options RE2 can't parse (backreferences, lookarounds, ...) or would read
+    more narrowly than re leave the whole set to re alone.
+    """
+    if not re2 or not options:
+        return None
+
+    settings = re2.Options()
+    settings.encoding = re2.Options.Encoding.LATIN1
+    settings.log_errors = False
+    prefilter = re2.Set.SearchSet(settings)
+
+    for o in options:
+        if not isinstance(o.pattern, bytes) or o.flags & (re.VERBOSE | re.LOCALE):
+            return None
+        if _RE2_NARROWER.search(o.pattern):
+            return None
+        # s and m only ever widen ., ^ and $, so they keep the superset intact
+        flags = b"(?ism)" if o.flags & re.IGNORECASE else b"(?sm)"
+        try:
+            prefilter.Add(flags + o.pattern)
+        except re2.error:
+            return None
+
+    try:
+        prefilter.Compile()
+    except re2.error:
+        return None
+    return prefilter
+
+@lru_cache(maxsize=64)
+def _scanner(options):
+    """Build search(buffer, pos) -> (index, match) or None for expect().
+
+    Options may be compiled patterns or raw str/bytes, which are compiled
+    here once (str as utf-8, with DOTALL) and cached along with the scanner.
+    When google-re2 is installed, each pass first checks the unread buffer
+    against an RE2 set of all the options, a linear-time automaton, and only
+    runs re once the set reports a match, so waiting never backtracks.
+    """
+    options = tuple(_compile(o) for o in options)
+    search = _search(options)
+    prefilter = _prefilter(options)
+    if not prefilter:
+        return search
+
+    def search_filtered(buffer, pos):
+        # keep the byte before pos in view, since re reads it for \b at pos;
+        # a set match starting on it only costs a needless re pass
+        with memoryview(buffer)[max(pos - 1, 0):] as view:
+            if not prefilter.Match(view):
+                return None
+        return search(buffer, pos)
+
+    return search_filtered
+
+def _search(options):
+    """Build the exact re-based search behind _scanner.
+
+    The earliest match in the buffer wins, ties going to the first option.
+    Where possible the options are joined into one alternation, so the
+    buffer is scanned once for all of them; the alternative that matched is
+    recovered from lastindex and re-matched at the same spot so the caller
+    still gets a match object from its own pattern.
+    """
+    searchers = tuple(enumerate(o.search for o in options))
+
+    def search_each(buffer, pos):
+        best = None
+        for i, search in searchers:
+            m = search(buffer, pos)
+            if m and (not best or m.start() < best[1].start()):
+                best = (i, m)
+        return best
+
+    if len({(type(o.pattern), o.flags) for o in options}) != 1:
+        return search_each
+    if any(_GROUP_REFS.search(o.pattern if isinstance(o.pattern, str) else o.pattern.decode("latin-1"))
+           for o in options):
+        return search_each
+
+    if isinstance(options[0].pattern, str):
+        lparen, bar, rparen = "(", "|", ")"
+    else:
+        lparen, bar, rparen = b"(", b"|", b")"
+
+    pieces, index, group = [], {}, 1
+    for i, option in enumerate(options):
+        pieces.append(lparen + option.pattern + rparen)
+        index[group] = i
+        group += option.groups + 1
+
+    try:
+        combined = re.compile(bar.join(pieces), options[0].flags)
+    except re.error:
+        return search_each
+
+    search = combined.search
+    matches = tuple(o.match for o in options)
+
+    def search_combined(buffer, pos):
+        m = search(buffer, pos)
+        if not m:
+            return None
+        i = index[m.lastindex]
+        return (i, matches[i](buffer, m.start()))
+
+    return search_combined
+
+@lru_cache(maxsize=64)
+def _finder(match):
+    """Build find(buffer, pos) -> index of match or -1 for read_until().
+
+    A single byte is left to bytearray.find, which is a memchr. Longer
+    delimiters go through a compiled, escaped regex: its literal search
+    beats find on multi-byte needles and its setup is kept across calls.
+    """
+    if len(match) == 1:
+        return lambda buffer, pos: buffer.find(match, pos)
+
+    search = re.compile(re.escape(match)).search
+
+    def find(buffer, pos):
+        m = search(buffer, pos)
+        return m.start() if m else -1
+
+    return find
+
+# scatter/gather syscalls take at most IOV_MAX buffers per call (1024 on linux)
+_IOV_MAX = 1024
+
+def _writev(send, parts):
+    """Write every buffer in parts with send(buffers) -> bytes written.
+
+    Buffers are submitted up to _IOV_MAX at a time without concatenating
+    them, and the list is trimmed and resubmitted after a short write.
+    """
+    views = [v for v in (memoryview(p).cast("B") for p in parts) if v]
+    total = sum(len(v) for v in views)
+
+    i = 0
+    while i < len(views):
+        n = send(views[i:i + _IOV_MAX])
+        while n:
+            if n < len(views[i]):
+                views[i] = views[i][n:]
+                break
+            n -= len(views[i])
+            i += 1
+
+    return total
+
 class SocketBackend:
     def __init__(self, host, port):
-        self.logger = logging.getLogger("pyinteract.SocketBackend.{id}".format(id=id(self)))
         self.host = host
         self.port = port
 
         try:
-            self.logger.info("connecting to %s:%s", host, port)
+            _log.info("%s: connecting to %s:%s", self, host, port)
             self.socket = socket.create_connection((host, port))
-        except:
-            self.logger.warning("connection failed!")
+        except OSError:
+            _log.warning("%s: connection failed!", self)
             raise
 
+        self._rxbuf = bytearray(65536)
+        self._rxview = memoryview(self._rxbuf)
+
+        self._poller = _Poller()
+        self._poller.register(self.get_read_handle(), _POLLIN)
+
     def get_read_handle(self):
         return self.socket
 
     def close(self):
-        self.logger.info("closing")
-        if self.socket:
-            self.socket.close()
+        if not self.socket:
+            return
+        _log.info("%s: closing", self)
+        self.socket.close()
         self.socket = None
+        # free the poll fd and receive buffer now rather than whenever the
+        # backend is collected; views handed out by read() stay valid
+        if hasattr(self._poller, "close"):
+            self._poller.close()
+        self._rxview.release()
 
     def read(self, timeout=None):
         if not self.socket:
-            self.logger.warning("read failed: socket closed")
+            _log.warning("%s: read failed: socket closed", self)
             raise EOFError()
 
         if timeout:
-            if not select.select([self.get_read_handle()], [], [], timeout)[0]:
-                self.logger.warning("read failed: timeout")
+            if not self._poller.poll(timeout * _POLL_SCALE):
+                _log.warning("%s: read failed: timeout", self)
                 raise TimeoutError()
 
-        result = self.socket.recv(1024)
+        # the returned view aliases the receive buffer and is only valid
+        # until the next read
+        n = self.socket.recv_into(self._rxview)
 
-        if not result:
-            self.logger.warning("read failed: EOF")
+        if not n:
+            _log.warning("%s: read failed: EOF", self)
             raise EOFError()
 
-        self.logger.info("read %i bytes", len(result))
-        return result
+        # drain anything else that is already queued without blocking, so
+        # bursts arrive in one read rather than one loop iteration per segment;
+        # an error here (a reset, say) must not cost the bytes already read,
+        # so it is left for the next read to run into
+        try:
+            while n < len(self._rxbuf):
+                m = self.socket.recv_into(self._rxview[n:], 0, socket.MSG_DONTWAIT)
+                if not m:
+                    break
+                n += m
+        except OSError:
+            pass
+
+        if _log.isEnabledFor(logging.INFO):
+            _log.info("%s: read %i bytes", self, n)
+        return self._rxview[:n]
 
     def write(self, bytestring, timeout=None):
         try:
             self.socket.sendall(bytestring)
-            self.logger.info("wrote %i bytes", len(bytestring))
-        except:
-            self.logger.warning("write failed!")
+            if _log.isEnabledFor(logging.INFO):
+                _log.info("%s: wrote %i bytes", self, len(bytestring))
+        except OSError:
+            _log.warning("%s: write failed!", self)
+            raise
+
+    def writev(self, parts, timeout=None):
+        try:
+            n = _writev(self.socket.sendmsg, parts)
+            if _log.isEnabledFor(logging.INFO):
+                _log.info("%s: wrote %i bytes", self, n)
+        except OSError:
+            _log.warning("%s: write failed!", self)
+            raise
 
 class ProcessBackend:
     def __init__(self, command, *args, **kwargs):
-        self.logger = logging.getLogger("pyinteract.ProcessBackend.{id}".format(id=id(self)))
         self.command = command
 
         try:
-            self.logger.info("running %s with args: %s", command, ", ".join(args))
+            _log.info("%s: running %s with args: %s", self, command, args)
             self.process = subprocess.Popen(command, *args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **kwargs)
-        except:
-            self.logger.warning("popen failed!")
+        except (OSError, ValueError):
+            _log.warning("%s: popen failed!", self)
             raise
 
+        self._rxbuf = bytearray(65536)
+        self._rxview = memoryview(self._rxbuf)
+
+        self._poller = _Poller()
+        self._poller.register(self.get_read_handle(), _POLLIN)
+
     def get_read_handle(self):
         return self.process.stdout.raw
 
     def close(self):
-        self.logger.info("closing")
-        if self.process:
-            self.process.terminate()
-        self.process = None
+        if not self.process:
+            return
+        _log.info("%s: closing", self)
+        process, self.process = self.process, None
+        process.stdin.close()
+        process.stdout.close()
+        process.terminate()
+        try:
+            process.wait(1)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        if hasattr(self._poller, "close"):
+            self._poller.close()
+        self._rxview.release()
 
     def read(self, timeout=None):
         if not self.process:
-            self.logger.warning("read failed: process ended")
+            _log.warning("%s: read failed: process ended", self)
             raise EOFError()
 
         if timeout:
-            if not select.select([self.get_read_handle()], [], [], timeout)[0]:
-                self.logger.warning("read failed: timeout")
+            if not self._poller.poll(timeout * _POLL_SCALE):
+                _log.warning("%s: read failed: timeout", self)
                 raise TimeoutError()
 
-        result = self.process.stdout.raw.readline()
+        # the returned view aliases the receive buffer and is only valid
+        # until the next read
+        n = self.process.stdout.raw.readinto(self._rxview)
 
-        if not result:
-            self.logger.warning("read failed: EOF")
+        if not n:
+            _log.warning("%s: read failed: EOF", self)
             raise EOFError()
 
-        self.logger.info("read %i bytes", len(result))
-        return result
+        if _log.isEnabledFor(logging.INFO):
+            _log.info("%s: read %i bytes", self, n)
+        return self._rxview[:n]
 
     def write(self, bytestring, timeout=None):
         try:
             self.process.stdin.raw.write(bytestring)
-            self.logger.info("wrote %i bytes", len(bytestring))
-        except:
-            self.logger.warning("write failed!")
+            if _log.isEnabledFor(logging.INFO):
+                _log.info("%s: wrote %i bytes", self, len(bytestring))
+        except OSError:
+            _log.warning("%s: write failed!", self)
+            raise
+
+    def writev(self, parts, timeout=None):
+        try:
+            n = _writev(partial(os.writev, self.process.stdin.fileno()), parts)
+            if _log.isEnabledFor(logging.INFO):
+                _log.info("%s: wrote %i bytes", self, n)
+        except OSError:
+            _log.warning("%s: write failed!", self)
             raise
 
 class Interact:
-    def host(host="localhost", port=8080):
+    def host(host="localhost", port=8080, backend="socket"):
+        # "uring" named an io_uring backend that was withdrawn; it still
+        # selects the socket backend, as it always did without liburing
+        if backend not in ("socket", "uring"):
+            raise ValueError("unknown backend: {b}".format(b=backend))
         return Interact(SocketBackend(host, port))
 
     def command(cmd, *args):
         return Interact(ProcessBackend(cmd, *args))
 
     def __init__(self, backend):
-        self.logger = logging.getLogger("pyinteract.Interact.{id}".format(id=id(self)))
         self.backend = backend
-        self.buffer = b''
+        self.buffer = bytearray()
+        self._off = 0
+        # (delimiter, scanned) left by a read_until that timed out or failed
+        self._scan = None
 
     def close(self):
         self.backend.close()
@@ -134,80 +397,174 @@ class Interact:
     def write(self, buffer):
         self.backend.write(buffer)
 
+    def writev(self, parts):
+        self.backend.writev(parts)
+
+    def _compact(self):
+        # move the unread tail into a fresh buffer; views handed out by
+        # _consume keep the old one alive, so this never disturbs them
+        self.buffer = self.buffer[self._off:]
+        self._off = 0
+
+    def _append(self, data):
+        if self._off > 4096 and self._off * 2 > len(self.buffer):
+            self._compact()
+        try:
+            self.buffer.extend(data)
+        except BufferError:
+            # a returned view still pins the buffer, so it cannot grow
+            self._compact()
+            self.buffer.extend(data)
+
+    def _consume(self, end):
+        # hand back a zero-copy view of buffer[off:end]; use tobytes() on it
+        # when a standalone copy is needed
+        result = memoryview(self.buffer)[self._off:end]
+        self._off = end
+        self._scan = None
+        return result
+
     def read_until(self, match, timeout=None):
+        # running out of time, whether between reads or while the backend
+        # waits, returns an empty view rather than raising
         deadline = None
         if timeout:
             deadline = _time() + timeout
 
-        while not deadline or _time() <= deadline:
-            i = self.buffer.find(match)
+        match = bytes(match)
+
+        # bytes already searched, relative to _off so compaction can't skew it;
+        # only the last len(match) - 1 of them can start a straddling match.
+        # a retry for the same delimiter picks up where the last call stopped
+        scanned = 0
+        if self._scan and self._scan[0] == match:
+            scanned = self._scan[1]
+
+        # the compiled loop (interact/_hotloop.pyx) does the same with memmem
+        if _read_until:
+            end = _read_until(self, match, scanned, deadline or 0.0)
+            return self._consume(end) if end >= 0 else memoryview(b'')
+
+        find = _finder(match)
+        while True:
+            i = find(self.buffer, self._off + scanned)
 
             if i >= 0:
-                i += len(match)
-                result = self.buffer[:i]
-                self.buffer = self.buffer[i:]
-                return result
+                return self._consume(i + len(match))
 
-            if timeout:
-                timeout = deadline = _time()
+            scanned = max(len(self.buffer) - self._off - len(match) + 1, scanned)
+            self._scan = (match, scanned)
 
-            self.buffer += self.backend.read(timeout)
+            if deadline:
+                timeout = deadline - _time()
+                if timeout <= 0:
+                    return memoryview(b'')
 
-        return b''
+            try:
+                self._append(self.backend.read(timeout))
+            except TimeoutError:
+                return memoryview(b'')
 
     def read_all(self):
         try:
             while True:
-                self.buffer += self.backend.read()
+                self._append(self.backend.read())
         except EOFError:
             pass
 
-        result = self.buffer
-        self.buffer = b''
-        return result
+        return self._consume(len(self.buffer))
 
-    def expect(self, options, timeout=None):
+    def expect(self, options, timeout=None, searchwindowsize=None):
+        # like read_until, a timeout returns (-1, None, empty view)
         deadline = None
         if timeout:
             deadline = _time() + timeout
 
-        indices = range(len(options))
-
-        while not deadline or _time() <= deadline:
-            for i in indices:
-                m = options[i].search(self.buffer)
-                if m:
-                    e = m.end()
-                    text = self.buffer[:e]
-                    self.buffer = self.buffer[e:]
-                    return (i, m, text)
-
-            if timeout:
-                timeout = deadline = _time()
+        search = _scanner(tuple(options))
 
-            self.buffer += self.backend.read(timeout)
+        # regex matches have no length bound, so by default every pass
+        # rescans the whole unread buffer; a searchwindowsize caps how far
+        # before newly arrived data a match may start
+        scanned = 0
 
-        return (-1, None, text)
+        while True:
+            # search a view that starts at the unread data, so ^, \A, \b and
+            # lookbehinds never see consumed bytes and match positions are
+            # relative to it; _append may swap in a fresh buffer, so re-read
+            # it every pass
+            buf = self.buffer
+            window = memoryview(buf)[self._off:]
+            found = search(window, scanned)
+            if found:
+                i, m = found
+                return (i, m, self._consume(self._off + m.end()))
+            # nothing refers to the window any more, so let the buffer grow
+            window.release()
+
+            if deadline:
+                timeout = deadline - _time()
+                if timeout <= 0:
+                    return (-1, None, memoryview(b''))
+
+            if searchwindowsize:
+                scanned = max(len(buf) - self._off - searchwindowsize, 0)
+            try:
+                self._append(self.backend.read(timeout))
+            except TimeoutError:
+                return (-1, None, memoryview(b''))
 
     def interact(self):
-        console = sys.stdin
-        remote  = self.backend.get_read_handle()
-
-        while True:
-            readers = select.select([console, remote], [], [])[0]
-            if console in readers:
-                line = sys.stdin.readline().encode('ascii')
-                if not line:
-                    return
-                self.write(line)
-            elif remote in readers:
-                try:
-                    data = self.backend.read()
-                    if data:
-                        sys.stdout.write(data.decode('ascii', errors='replace'))
-                        sys.stdout.flush()
-                except EOFError:
-                    return
+        console  = sys.stdin.fileno()
+        # wait on the backend's own poller rather than building another one
+        poller   = self.backend._poller
+        # pass remote output through as raw bytes when stdout allows it
+        output   = getattr(sys.stdout, 'buffer', None)
+
+        if output is not None:
+            sys.stdout.flush()
+        try:
+            poller.register(console, _POLLIN)
+            always = []
+        except PermissionError:
+            # epoll refuses regular files and /dev/null; they are always
+            # readable, so report the console ready on every pass
+            always = [(console, _POLLIN)]
+        try:
+            done = False
+            while not done:
+                # gather everything that is ready right now (within reason),
+                # then pass each direction on with a single write
+                outgoing, incoming, pending = [], bytearray(), 0
+                ready = always + poller.poll(0 if always else None)
+                while ready and not done and pending < 65536:
+                    for fd, _ in ready:
+                        if fd == console:
+                            data = os.read(console, 65536)
+                            if not data:
+                                done = True
+                                continue
+                            outgoing.append(data)
+                        else:
+                            try:
+                                data = self.backend.read()
+                            except EOFError:
+                                done = True
+                                continue
+                            incoming.extend(data)
+                        pending += len(data)
+                    ready = always + poller.poll(0)
+
+                if outgoing:
+                    self.writev(outgoing)
+                if incoming and output is not None:
+                    output.write(incoming)
+                    output.flush()
+                elif incoming:
+                    sys.stdout.write(str(incoming, 'ascii', errors='replace'))
+                    sys.stdout.flush()
+        finally:
+            if not always:
+                poller.unregister(console)
 
 def main(method, *args):
     logging.basicConfig(format='%(asctime)-15s %(levelname)s %(name)s - %(message)s', level=logging.WARNING)
@@ -0,0 +1,55 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""Compiled wait loop behind Interact.read_until.
+
+Built by setup.py when Cython is available; interact falls back to the
+pure-Python loop when this module is missing.
+"""
+
+from cpython.bytearray cimport PyByteArray_AS_STRING, PyByteArray_GET_SIZE
+from time import monotonic as _time
+
+cdef extern from "string.h":
+    void *memmem(const void *haystack, size_t haystacklen, const void *needle, size_t needlelen) nogil
+
+def read_until(interact, bytes match, Py_ssize_t scanned, double deadline):
+    """Read into interact.buffer until match appears past _off + scanned.
+
+    Returns the end offset of the match in interact.buffer, or -1 once the
+    deadline (0 for none) has passed, including when the backend's read
+    times out. Mirrors Interact.read_until: the scan state is recorded on
+    interact._scan before every wait, so a timeout or error from the
+    backend leaves it for the next call.
+    """
+    cdef Py_ssize_t n = len(match)
+    cdef Py_ssize_t off, size
+    cdef const char *base
+    cdef const char *hit
+    cdef double timeout
+
+    read = interact.backend.read
+    append = interact._append
+
+    while True:
+        # _append may swap in a fresh buffer, so look it up every pass
+        buffer = interact.buffer
+        off = interact._off
+        size = PyByteArray_GET_SIZE(buffer)
+        base = PyByteArray_AS_STRING(buffer)
+
+        hit = <const char *>memmem(base + off + scanned, size - off - scanned, <const char *>match, n)
+        if hit != NULL:
+            return hit - base + n
+
+        scanned = max(size - off - n + 1, scanned)
+        interact._scan = (match, scanned)
+
+        if deadline:
+            timeout = deadline - _time()
+            if timeout <= 0:
+                return -1
+            try:
+                append(read(timeout))
+            except TimeoutError:
+                return -1
+        else:
+            append(read(None))
@@ -2,6 +2,14 @@
 
 import setuptools
 
+# the compiled read_until loop is optional: it is only built when Cython is
+# around, and interact falls back to pure Python without it
+try:
+    from Cython.Build import cythonize
+    ext_modules = cythonize([setuptools.Extension("interact._hotloop", ["interact/_hotloop.pyx"], optional=True)])
+except ImportError:
+    ext_modules = []
+
 with open("README.md", "r") as fh:
     long_description = fh.read()
 
@@ -16,6 +24,7 @@ setuptools.setup(
      long_description_content_type="text/markdown",
      url="",
      packages=["interact"],
+     ext_modules=ext_modules,
      classifiers=[
          "Programming Language :: Python :: 3",
          "License :: OSI Approved :: MIT License",
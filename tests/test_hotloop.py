@@ -0,0 +1,43 @@
+import random
+import unittest
+from collections import deque
+from unittest import mock
+
+import interact
+from interact import Interact
+
+class ChunkBackend:
+    """Hands out a fixed list of chunks, then times out."""
+    def __init__(self, chunks):
+        self.chunks = deque(chunks)
+
+    def read(self, timeout=None):
+        if not self.chunks:
+            raise TimeoutError()
+        return memoryview(bytearray(self.chunks.popleft()))
+
+    def close(self):
+        pass
+
+def read_all_until(chunks, delimiters):
+    i = Interact(ChunkBackend(chunks))
+    return [bytes(i.read_until(d, timeout=60)) for d in delimiters]
+
+@unittest.skipUnless(interact._read_until, "interact._hotloop is not built")
+class HotloopTest(unittest.TestCase):
+    def test_matches_python_loop(self):
+        rnd = random.Random(1)
+        for _ in range(3000):
+            data = bytes(rnd.choice(b"abc\n") for _ in range(rnd.randint(0, 2000)))
+            cuts = sorted(rnd.sample(range(len(data) + 1), min(len(data), rnd.randint(0, 50))))
+            chunks = [data[a:b] for a, b in zip([0] + cuts, cuts + [len(data)]) if b > a]
+            delimiters = [bytes(rnd.choice(b"abc\n") for _ in range(rnd.randint(1, 4)))
+                          for _ in range(30)]
+
+            compiled = read_all_until(chunks, delimiters)
+            with mock.patch.object(interact, "_read_until", None):
+                python = read_all_until(chunks, delimiters)
+            self.assertEqual(compiled, python, (chunks, delimiters))
+
+if __name__ == "__main__":
+    unittest.main()
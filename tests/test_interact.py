@@ -0,0 +1,76 @@
+import time
+import unittest
+
+from interact import Interact
+
+class ScriptedBackend:
+    """Returns each (delay, data) step after its delay, honouring timeouts.
+
+    A step that takes longer than the read's timeout raises TimeoutError
+    once the timeout is spent, and is then that much closer to arriving.
+    """
+    def __init__(self, steps):
+        self.steps = list(steps)
+
+    def read(self, timeout=None):
+        if not self.steps:
+            if timeout:
+                time.sleep(timeout)
+                raise TimeoutError()
+            raise EOFError()
+
+        delay, data = self.steps[0]
+        if timeout and delay > timeout:
+            time.sleep(timeout)
+            self.steps[0] = (delay - timeout, data)
+            raise TimeoutError()
+
+        time.sleep(delay)
+        self.steps.pop(0)
+        return memoryview(bytearray(data))
+
+    def close(self):
+        pass
+
+class TimeoutTest(unittest.TestCase):
+    def test_read_until_before_deadline(self):
+        i = Interact(ScriptedBackend([(0.01, b"ab"), (0.01, b"c\nd")]))
+        self.assertEqual(bytes(i.read_until(b"\n", timeout=1)), b"abc\n")
+
+    def test_read_until_backend_timeout(self):
+        i = Interact(ScriptedBackend([(0, b"part"), (0.2, b"ial\n")]))
+        result = i.read_until(b"\n", timeout=0.05)
+        self.assertIsInstance(result, memoryview)
+        self.assertEqual(bytes(result), b"")
+        # nothing read so far is lost
+        self.assertEqual(bytes(i.read_until(b"\n")), b"partial\n")
+
+    def test_read_until_deadline_between_reads(self):
+        # every read returns in time, but the delimiter never comes
+        i = Interact(ScriptedBackend([(0.02, b"x")] * 50))
+        start = time.monotonic()
+        self.assertEqual(bytes(i.read_until(b"\n", timeout=0.1)), b"")
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_expect_before_deadline(self):
+        i = Interact(ScriptedBackend([(0.01, b"login"), (0.01, b": rest")]))
+        index, m, text = i.expect([b"password: ", b"login: "], timeout=1)
+        self.assertEqual((index, m.group(), bytes(text)), (1, b"login: ", b"login: "))
+
+    def test_expect_backend_timeout(self):
+        i = Interact(ScriptedBackend([(0, b"log"), (0.2, b"in: ")]))
+        index, m, text = i.expect([b"login: "], timeout=0.05)
+        self.assertEqual((index, m), (-1, None))
+        self.assertIsInstance(text, memoryview)
+        self.assertEqual(bytes(text), b"")
+        self.assertEqual(i.expect([b"login: "])[0], 0)
+
+    def test_expect_deadline_between_reads(self):
+        i = Interact(ScriptedBackend([(0.02, b"x")] * 50))
+        start = time.monotonic()
+        index, m, text = i.expect([b"\n"], timeout=0.1)
+        self.assertEqual((index, m, bytes(text)), (-1, None, b""))
+        self.assertLess(time.monotonic() - start, 0.5)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import random
+import re
+import unittest
+import warnings
+
+import interact
+from interact import _scanner, _search
+
+# a spread of syntax RE2 handles differently from re, or not at all
+PATTERNS = [
+    rb"\w\W", rb"(?i)\xe9", rb"\d+", rb"[:]]", rb"x{1,}", rb"\s+x", rb"a\Sb", rb"x{,2}y",
+    rb"[[:alpha:]]", rb"[^\n]z", rb"\Bo", rb"(?x) a b", rb"(?i:ab)c", rb"\x41", rb"a{2}",
+    rb".$", rb"a(?:b|c)+d", rb"(?:foo|bar)baz", rb"[a-c]{2,4}x", rb"(?<=z)1", rb"h(?=o)",
+    rb"w\b", rb"\bw+", rb"\b: ", rb"\b ", rb"\b0", rb":\b", rb"\Bfoo", rb"(?<=a)b",
+    rb"(a)\1", rb"^x", rb"(?m)^y", rb"z$", rb"(?m)l$", rb"q*", rb"(?i)HELLO", rb"a.c",
+    rb"(?s)a.c", rb"[0-9]{3}", rb"\Az", rb"0\Z", rb"(?=ab)a", rb"(?!a)b", rb"x(?<!y)",
+    rb"(?P<n>[ab])(?P=n)", rb"\d\s\w", rb"[^a-z]+$", rb"ab", rb"l+h", rb"(?:x|y)0",
+]
+ALPHABET = b"abcxyzfoqwhel\n0123 AB\r\v\t\xe9\xc9\xff:]{,}"
+FLAGS = [0, re.I, re.M, re.S]
+
+# options with groups of their own, to exercise the renumbering
+GROUPED = [
+    rb"(a)(b)?", rb"(?P<x>c+)d", rb"(x|y)+(z)", rb"((a)b)c", rb"a|b", rb"(\d)(\d)?",
+    rb"(?:ab)+", rb"(a)?(?(1)b|c)", rb"(.)\1", rb"(?P<q>[xy])(?P=q)", rb"()", rb"(?i)(A)",
+]
+
+def found(result):
+    return result and (result[0], result[1].span())
+
+def reference(options, buffer, pos):
+    """Search each option on its own; the earliest match wins, ties going to the first."""
+    best = None
+    for i, option in enumerate(options):
+        m = option.search(buffer, pos)
+        if m and (not best or m.start() < best[1].start()):
+            best = (i, m)
+    return best
+
+class SearchTest(unittest.TestCase):
+    def assertSameMatch(self, result, expected, context):
+        self.assertEqual(found(result), found(expected), context)
+        if expected:
+            self.assertIs(result[1].re, expected[1].re, context)
+            self.assertEqual(result[1].groups(), expected[1].groups(), context)
+            self.assertEqual(result[1].groupdict(), expected[1].groupdict(), context)
+
+    def test_earliest_match_wins(self):
+        options = (re.compile(rb"b"), re.compile(rb"a"))
+        self.assertEqual(found(_search(options)(bytearray(b"xab"), 0)), (1, (1, 2)))
+
+    def test_tie_goes_to_first_option(self):
+        options = (re.compile(rb"ab"), re.compile(rb"a"))
+        self.assertEqual(found(_search(options)(bytearray(b"xab"), 0)), (0, (1, 3)))
+        options = (re.compile(rb"a"), re.compile(rb"ab"))
+        self.assertEqual(found(_search(options)(bytearray(b"xab"), 0)), (0, (1, 2)))
+
+    def test_combined_groups(self):
+        options = tuple(re.compile(p) for p in (rb"(a)(b)?", rb"(?P<x>c+)d", rb"((e)f)g"))
+        search = _search(options)
+        self.assertEqual(search.__name__, "search_combined")
+        i, m = search(bytearray(b"zzccd"), 0)
+        self.assertEqual((i, m.group("x"), m.re), (1, b"cc", options[1]))
+        i, m = search(bytearray(b"efg"), 0)
+        self.assertEqual((i, m.groups()), (2, (b"ef", b"e")))
+
+    def test_falls_back_to_each_option(self):
+        for patterns in ([rb"(a)\1", rb"b"], [rb"(a)?(?(1)b|c)", rb"d"]):
+            options = tuple(re.compile(p) for p in patterns)
+            self.assertEqual(_search(options).__name__, "search_each", patterns)
+        options = (re.compile(rb"a"), re.compile(rb"b", re.I))
+        self.assertEqual(_search(options).__name__, "search_each")
+
+    def test_matches_reference(self):
+        rnd = random.Random(2)
+        alphabet = b"abcdefxyz0123AB\n"
+        combined = 0
+        for _ in range(40000):
+            # one shared flag set half the time, so the options get merged
+            flags = rnd.choice(FLAGS) if rnd.random() < 0.5 else None
+            with warnings.catch_warnings():
+                # [:]] and friends warn again each time they are merged
+                warnings.simplefilter("ignore", FutureWarning)
+                options = tuple(re.compile(p, rnd.choice(FLAGS) if flags is None else flags)
+                                for p in rnd.sample(PATTERNS + GROUPED, rnd.randint(1, 4)))
+                search = _search(options)
+            buffer = bytearray(rnd.choice(alphabet) for _ in range(rnd.randint(0, 20)))
+            pos = rnd.randint(0, len(buffer))
+            combined += search.__name__ == "search_combined"
+            self.assertSameMatch(search(buffer, pos), reference(options, buffer, pos),
+                                 (options, buffer, pos))
+        self.assertGreater(combined, 10000)
+
+@unittest.skipUnless(interact.re2, "google-re2 is not installed")
+class PrefilterTest(unittest.TestCase):
+    def test_word_boundary_at_pos(self):
+        options = (re.compile(rb"\b: "),)
+        self.assertEqual(found(_scanner(options)(bytearray(b"login: "), 5)), (0, (5, 7)))
+
+    def test_matches_re(self):
+        # the RE2 set must never reject a buffer that re would match
+        rnd = random.Random(1)
+        for _ in range(40000):
+            options = tuple(re.compile(p, rnd.choice(FLAGS))
+                            for p in rnd.sample(PATTERNS, rnd.randint(1, 3)))
+            buffer = bytearray(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 30)))
+            pos = rnd.randint(0, len(buffer))
+            self.assertEqual(found(_scanner(options)(buffer, pos)),
+                             found(_search(options)(buffer, pos)),
+                             (options, buffer, pos))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import socket
+import struct
+import threading
+import time
+import unittest
+
+from interact import Interact, SocketBackend
+
+class SocketBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen()
+        self.addCleanup(self.server.close)
+
+    def test_backend_names(self):
+        port = self.server.getsockname()[1]
+        with self.assertRaises(ValueError):
+            Interact.host("127.0.0.1", port, backend="bogus")
+        for backend in ("socket", "uring"):
+            with Interact.host("127.0.0.1", port, backend=backend) as i:
+                self.assertIsInstance(i.backend, SocketBackend)
+
+    def test_reset_keeps_data_already_read(self):
+        # the peer's last bytes and its RST are queued together, so the
+        # reset surfaces in the non-blocking drain after the first recv
+        def serve():
+            conn, _ = self.server.accept()
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            conn.sendall(b"important payload\n")
+            conn.close()
+
+        server = threading.Thread(target=serve)
+        server.start()
+        with Interact.host("127.0.0.1", self.server.getsockname()[1]) as i:
+            server.join()
+            time.sleep(0.05)
+            self.assertEqual(bytes(i.read_until(b"\n")), b"important payload\n")
+            with self.assertRaises((EOFError, OSError)):
+                i.read_until(b"\n")
+
+if __name__ == "__main__":
+    unittest.main()
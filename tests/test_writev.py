@@ -0,0 +1,59 @@
+import random
+import unittest
+
+from interact import _IOV_MAX, _writev
+
+class ShortSend:
+    """Fake send(buffers) that takes as many bytes as limit(buffers) allows."""
+    def __init__(self, test, limit):
+        self.test = test
+        self.limit = limit
+        self.sent = bytearray()
+        self.calls = 0
+
+    def __call__(self, buffers):
+        self.test.assertLessEqual(len(buffers), _IOV_MAX)
+        self.test.assertTrue(all(buffers))
+        self.calls += 1
+        data = b"".join(buffers)
+        n = min(self.limit(buffers), len(data))
+        self.sent += data[:n]
+        return n
+
+class WritevTest(unittest.TestCase):
+    def check(self, parts, limit):
+        send = ShortSend(self, limit)
+        self.assertEqual(_writev(send, parts), sum(len(p) for p in parts))
+        # every byte went out exactly once, in order
+        self.assertEqual(bytes(send.sent), b"".join(parts))
+        return send
+
+    def test_whole_writes(self):
+        send = self.check([b"abc", b"", bytearray(b"de"), memoryview(b"fgh")], lambda b: 1 << 20)
+        self.assertEqual(send.calls, 1)
+
+    def test_mid_buffer_splits(self):
+        self.check([b"abcde", b"fghij", b"klmno"], lambda b: 3)
+
+    def test_exact_buffer_boundaries(self):
+        # always end on the edge of the first buffer submitted
+        self.check([b"ab", b"cde", b"f", b"ghij"], lambda b: len(b[0]))
+
+    def test_more_than_iov_max_parts(self):
+        parts = [bytes([i % 256]) * (1 + i % 3) for i in range(3 * _IOV_MAX + 5)]
+        send = self.check(parts, lambda b: 1 << 20)
+        self.assertEqual(send.calls, 4)
+
+    def test_more_than_iov_max_parts_short(self):
+        parts = [bytes([i % 256]) * (1 + i % 3) for i in range(3 * _IOV_MAX + 5)]
+        self.check(parts, lambda b: 1000)
+
+    def test_random_short_writes(self):
+        rnd = random.Random(3)
+        for _ in range(200):
+            parts = [bytes(rnd.getrandbits(8) for _ in range(rnd.randint(0, 8)))
+                     for _ in range(rnd.randint(0, 2500))]
+            self.check(parts, lambda b: rnd.randint(1, 5000))
+
+if __name__ == "__main__":
+    unittest.main()